@@ -0,0 +1,252 @@
+"""
+Benchmark every built-in template against the real Manim and ffmpeg.
+
+Each combination of template, resolution, frame rate and duration goes
+through ManimGenerator.render_manim, the same path production uses. The
+frame rate is passed as settings["frame_rate_override"], which render_manim
+turns into --frame_rate. Reusable templates are measured cold (empty template
+cache: transparent base render plus ffmpeg composite) and warm (composite
+only). The text template always gets a full Manim render, so it is measured
+once as "full". Each result records wall time, CPU time, peak RSS and output
+size, and can be compared against a stored baseline.
+
+Every render runs in a freshly spawned worker process. CPU time and peak RSS
+are that worker's getrusage(RUSAGE_CHILDREN), so they cover only that
+render's Manim and ffmpeg processes. ru_maxrss is in KB on Linux but bytes
+on macOS; it is normalized to KB here.
+
+Usage (from backend/manim-api):
+    python -m benchmarks.template_benchmark --output results.json
+    python -m benchmarks.template_benchmark --baseline baseline.json --threshold 0.2
+    python -m benchmarks.template_benchmark --output baseline.json --frame-rates 30
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from typing import Dict, Any, List, Optional
+import logging
+
+from services.mainm_generator import ManimGenerator, RESOLUTION_MAP
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Metrics compared against the baseline; higher is worse for all of them
+METRICS = ["wall_time", "cpu_time", "peak_rss_kb", "file_size"]
+
+BENCHMARK_TEXT = "Hello World"
+
+# ru_maxrss is reported in bytes on macOS and KB elsewhere
+RSS_DIVISOR = 1024 if sys.platform == "darwin" else 1
+
+
+def template_codes(generator: ManimGenerator, duration: float) -> Dict[str, str]:
+    """Manim code produced by every built-in template for a duration"""
+    codes = {
+        name: template(duration, "#000000")
+        for name, (template, _) in generator.reusable_templates.items()
+    }
+    codes["text"] = generator._generate_text_animation(BENCHMARK_TEXT, duration, "#000000")
+    return codes
+
+
+def clear_template_cache(cache_dir: str):
+    """Empty the template render cache so the next render is cold"""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+
+def configure_generator(work_dir: str, manim_version: str) -> ManimGenerator:
+    """Generator writing everything under the benchmark's work directory"""
+    generator = ManimGenerator()
+    generator.output_dir = os.path.join(work_dir, "videos")
+    generator.temp_dir = os.path.join(work_dir, "temp")
+    generator.template_cache.cache_dir = os.path.join(work_dir, "template_cache")
+    # Known up front, so no `manim --version` child skews the measurements
+    generator._manim_version = manim_version
+    return generator
+
+
+def render_in_worker(work_dir: str, manim_version: str, manim_code: str,
+                     resolution: str, frame_rate: int) -> Dict[str, Any]:
+    """
+    Render code through render_manim. Runs in a fresh worker process, so its
+    RUSAGE_CHILDREN covers exactly this render's child processes.
+    """
+    generator = configure_generator(work_dir, manim_version)
+    settings = {
+        "resolution": resolution,
+        "frame_rate_override": frame_rate,
+        "allow_degradation": False
+    }
+
+    start_time = time.perf_counter()
+    video_path, render_info = asyncio.run(
+        generator.render_manim(manim_code, "benchmark_output.mp4", settings)
+    )
+    wall_time = time.perf_counter() - start_time
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    os.unlink(video_path)
+
+    return {
+        "wall_time": wall_time,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "peak_rss_kb": usage.ru_maxrss // RSS_DIVISOR,
+        "file_size": render_info["file_size"],
+        "frame_rate": render_info["frame_rate"],
+        "template_reuse": render_info.get("template_reuse")
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Best value of each metric across repeated runs"""
+    summary = {metric: min(run[metric] for run in runs) for metric in METRICS}
+    summary["frame_rate"] = runs[0]["frame_rate"]
+    summary["template_reuse"] = runs[0]["template_reuse"] is not None
+    return summary
+
+
+def run_benchmarks(templates: Optional[List[str]], resolutions: List[str],
+                   frame_rates: List[int], durations: List[float],
+                   repeat: int) -> Dict[str, Any]:
+    """Render every combination, keeping the best of each repeat"""
+    generator = ManimGenerator()
+    manim_version = generator.get_version()
+    results = {}
+
+    # A new spawned worker for every render keeps per-render rusage isolated
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory(prefix="manim-bench-") as work_dir, \
+            context.Pool(processes=1, maxtasksperchild=1) as pool:
+        bench_generator = configure_generator(work_dir, manim_version)
+        cache_dir = bench_generator.template_cache.cache_dir
+        os.makedirs(bench_generator.output_dir, exist_ok=True)
+        os.makedirs(bench_generator.temp_dir, exist_ok=True)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        def render(code: str, resolution: str, frame_rate: int) -> Dict[str, Any]:
+            return pool.apply(render_in_worker,
+                              (work_dir, manim_version, code, resolution, frame_rate))
+
+        for duration in durations:
+            codes = template_codes(generator, duration)
+            for name, code in codes.items():
+                if templates and name not in templates:
+                    continue
+                for resolution in resolutions:
+                    for frame_rate in frame_rates:
+                        key = f"{name}/{resolution}/{frame_rate}fps/{duration:g}s"
+
+                        if name in generator.reusable_templates:
+                            cold_runs = []
+                            for _ in range(repeat):
+                                clear_template_cache(cache_dir)
+                                cold_runs.append(render(code, resolution, frame_rate))
+                            warm_runs = [render(code, resolution, frame_rate)
+                                         for _ in range(repeat)]
+                            modes = (("cold", cold_runs), ("warm", warm_runs))
+                        else:
+                            # Not a reusable template: every render is a full Manim render
+                            modes = (("full", [render(code, resolution, frame_rate)
+                                               for _ in range(repeat)]),)
+
+                        for mode, runs in modes:
+                            result = summarize(runs)
+                            results[f"{key}/{mode}"] = result
+                            logger.info(f"{key}/{mode}: {result['wall_time']:.2f}s wall, "
+                                        f"{result['cpu_time']:.2f}s cpu, "
+                                        f"{result['peak_rss_kb']} KB rss")
+
+    return {
+        "manim_version": manim_version,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": results
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float) -> List[str]:
+    """
+    List every metric that grew by more than threshold relative to the
+    baseline, and every baseline combination missing from the current results
+    """
+    regressions = []
+    current_results = current["results"]
+
+    for key in baseline.get("results", {}):
+        if key not in current_results:
+            regressions.append(f"{key}: present in baseline but missing from current results")
+
+    for key, metrics in current_results.items():
+        base_metrics = baseline.get("results", {}).get(key)
+        if not base_metrics:
+            continue
+        for metric in METRICS:
+            base_value = base_metrics.get(metric)
+            if not base_value:
+                continue
+            change = (metrics[metric] - base_value) / base_value
+            if change > threshold:
+                regressions.append(
+                    f"{key} {metric}: {base_value:g} -> {metrics[metric]:g} (+{change:.0%})"
+                )
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark built-in Manim templates")
+    parser.add_argument("--templates", nargs="+",
+                        help="Templates to run (default: all)")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTION_MAP),
+                        choices=list(RESOLUTION_MAP))
+    parser.add_argument("--frame-rates", nargs="+", type=int, default=[15, 30, 60])
+    parser.add_argument("--durations", nargs="+", type=float, default=[2.0, 5.0, 10.0])
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Renders per combination; the best run is kept")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="File to write results to")
+    parser.add_argument("--baseline", help="Baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative increase before a metric counts as a regression")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.templates, args.resolutions, args.frame_rates,
+                             args.durations, max(1, args.repeat))
+
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        logger.error(f"{len(regressions)} regressions against {args.baseline} "
+                     f"(manim {baseline.get('manim_version')} -> {current['manim_version']}):")
+        for regression in regressions:
+            logger.error(f"  {regression}")
+        return 1
+
+    logger.info(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -54,6 +54,7 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("🔄 Shutting down Manim API service...")
+    await manim_generator.shutdown()
     await file_manager.cleanup_temp_files()
     logger.info("✅ Shutdown complete!")
 
@@ -64,7 +65,9 @@ async def health_check():
         "status": "healthy",
         "service": "manim-api",
         "timestamp": datetime.now().isoformat(),
-        "manim_version": manim_generator.get_version()
+        "manim_version": manim_generator.get_version(),
+        "render_load": manim_generator.overload_policy.snapshot(),
+        "codegen": manim_generator.get_codegen_metrics()
     }
 
 @app.post("/generate-manim", response_model=GenerateResponse)
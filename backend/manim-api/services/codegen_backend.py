@@ -0,0 +1,164 @@
+import os
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Callable, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CodeGenBackend(ABC):
+    """
+    Interface for prompt-to-code backends. A backend receives a batch of
+    generation requests and returns, in order, Manim code or an exception
+    for each one.
+
+    Each request is a dict with prompt, duration, width, height, frame_rate
+    and background_color.
+
+    Backends whose output cannot differ between near duplicate prompts may
+    set allow_near_duplicates to let the prompt cache match them.
+    """
+
+    name = "base"
+    allow_near_duplicates = False
+
+    @abstractmethod
+    async def generate_batch(self, requests: List[Dict[str, Any]]) -> List[Union[str, Exception]]:
+        """Generate code for every request in the batch"""
+
+
+class TemplateCodeGenBackend(CodeGenBackend):
+    """
+    Local stand-in backend using keyword-based templates.
+    Needs no model or network access, so it is also what tests run against.
+    Near duplicate caching is safe here: the template is picked by keywords
+    and quoted text, both of which the prompt cache refuses to vary.
+    """
+
+    name = "template"
+    allow_near_duplicates = True
+
+    def __init__(self, generate_code: Callable[..., str]):
+        self.generate_code = generate_code
+
+    async def generate_batch(self, requests: List[Dict[str, Any]]) -> List[Union[str, Exception]]:
+        results = []
+        for request in requests:
+            try:
+                results.append(self.generate_code(
+                    request["prompt"], request["duration"], request["width"],
+                    request["height"], request["frame_rate"], request["background_color"]
+                ))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class PromptBatcher:
+    """
+    Groups prompts submitted within a short window into one backend call
+    """
+
+    def __init__(self, backend: CodeGenBackend):
+        self.backend = backend
+        self.window = float(os.getenv("CODEGEN_BATCH_WINDOW", "0.02"))
+        self.max_batch_size = int(os.getenv("CODEGEN_MAX_BATCH_SIZE", "16"))
+        self._pending: List[tuple] = []
+        self._flush_handle = None
+        self._running_batches = set()  # Strong references to in-flight batch tasks
+
+        self.batch_count = 0
+        self.request_count = 0
+        self.max_batch_seen = 0
+
+    async def submit(self, request: Dict[str, Any]) -> str:
+        """Queue a request for the next batch and wait for its code"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything pending to the backend as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running_batches.add(task)
+            task.add_done_callback(self._running_batches.discard)
+
+    async def _run_batch(self, batch: List[tuple]):
+        self.batch_count += 1
+        self.request_count += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+        # Identical concurrent requests only need to be generated once
+        unique_requests = {}
+        for request, _ in batch:
+            unique_requests.setdefault(tuple(sorted(request.items())), request)
+        keys = list(unique_requests)
+
+        results = dict(zip(keys, await self._generate(list(unique_requests.values()))))
+
+        for request, future in batch:
+            if future.done():
+                continue
+            result = results[tuple(sorted(request.items()))]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _generate(self, requests: List[Dict[str, Any]]) -> List[Union[str, Exception]]:
+        """
+        Call the backend for a batch. If the whole call fails, retry each
+        request on its own so one bad prompt doesn't fail the others.
+        """
+        try:
+            results = await self.backend.generate_batch(requests)
+            if len(results) != len(requests):
+                raise Exception(f"Backend returned {len(results)} results for {len(requests)} prompts")
+            return results
+        except Exception as e:
+            if len(requests) == 1:
+                logger.error(f"Code generation failed: {e}")
+                return [e]
+            logger.warning(f"Code generation batch of {len(requests)} failed, retrying individually: {e}")
+
+        results = []
+        for request in requests:
+            results.extend(await self._generate([request]))
+        return results
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Batching statistics"""
+        return {
+            "backend": self.backend.name,
+            "batches": self.batch_count,
+            "requests": self.request_count,
+            "average_batch_size": round(self.request_count / self.batch_count, 2) if self.batch_count else 0.0,
+            "max_batch_size": self.max_batch_seen
+        }
+
+
+def create_backend(generate_code: Callable[..., str]) -> CodeGenBackend:
+    """Build the backend selected by CODEGEN_BACKEND"""
+    backend_name = os.getenv("CODEGEN_BACKEND", "template")
+    backends = {
+        TemplateCodeGenBackend.name: lambda: TemplateCodeGenBackend(generate_code)
+    }
+
+    if backend_name not in backends:
+        raise Exception(f"Unknown code generation backend: {backend_name}")
+
+    logger.info(f"Using code generation backend: {backend_name}")
+    return backends[backend_name]()
@@ -0,0 +1,120 @@
+import os
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Resolutions ordered from cheapest to most expensive to render
+RESOLUTION_LADDER = ["480p", "720p", "1080p"]
+
+# Frame rates implied by Manim's -ql / -qm / -qh quality presets
+PRESET_FRAME_RATES = {"480p": 15, "720p": 30, "1080p": 60}
+
+LOAD_NORMAL = 0
+LOAD_ELEVATED = 1
+LOAD_OVERLOADED = 2
+
+
+class OverloadPolicy:
+    """
+    Watches render queue depth and recent render times and decides how far
+    incoming render jobs should be degraded to keep latency bounded.
+    """
+
+    def __init__(self):
+        self.queue_soft_limit = int(os.getenv("RENDER_QUEUE_SOFT_LIMIT", "4"))
+        self.queue_hard_limit = int(os.getenv("RENDER_QUEUE_HARD_LIMIT", "8"))
+        self.latency_soft_limit = float(os.getenv("RENDER_LATENCY_SOFT_LIMIT", "30"))
+        self.latency_hard_limit = float(os.getenv("RENDER_LATENCY_HARD_LIMIT", "90"))
+        # Below the -ql preset, so hard overload lowers frame rate even for 480p jobs
+        self.draft_frame_rate = int(os.getenv("RENDER_DRAFT_FRAME_RATE", "10"))
+        window = int(os.getenv("RENDER_LATENCY_WINDOW", "10"))
+
+        self.active_renders = 0
+        self.recent_render_times = deque(maxlen=max(1, window))
+
+    def start_render(self):
+        """Register a render entering the queue"""
+        self.active_renders += 1
+
+    def finish_render(self, render_time: Optional[float] = None):
+        """Register a render leaving the queue, recording its duration if it succeeded"""
+        self.active_renders = max(0, self.active_renders - 1)
+        if render_time is not None:
+            self.recent_render_times.append(render_time)
+
+    def average_render_time(self) -> float:
+        """Mean duration of the most recent renders"""
+        if not self.recent_render_times:
+            return 0.0
+        return sum(self.recent_render_times) / len(self.recent_render_times)
+
+    def load_level(self) -> int:
+        """Current load level based on queue depth and recent render times"""
+        # Slow past renders only matter while something is queued, otherwise
+        # an idle service would stay "overloaded" until the next render
+        avg_time = self.average_render_time() if self.active_renders else 0.0
+
+        if self.active_renders >= self.queue_hard_limit or avg_time >= self.latency_hard_limit:
+            return LOAD_OVERLOADED
+        if self.active_renders >= self.queue_soft_limit or avg_time >= self.latency_soft_limit:
+            return LOAD_ELEVATED
+        return LOAD_NORMAL
+
+    def plan(self, resolution: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decide the resolution and frame rate a job should actually render at.
+
+        Frame rates are those of the Manim quality preset for the resolution,
+        since that is what an undegraded render produces, unless the job sets
+        settings["frame_rate_override"]. Jobs opt out with
+        settings["allow_degradation"] = False. Under overload, jobs with
+        settings["allow_draft"] render a draft now and have the full quality
+        version queued for later.
+        """
+        level = self.load_level()
+
+        # Unknown resolutions render with the 720p preset (-qm)
+        base_resolution = resolution if resolution in RESOLUTION_LADDER else "720p"
+        base_frame_rate = settings.get("frame_rate_override") or PRESET_FRAME_RATES[base_resolution]
+
+        plan = {
+            "resolution": resolution,
+            "frame_rate": base_frame_rate,
+            "requested_frame_rate": base_frame_rate,
+            "degraded": False,
+            "draft": False,
+            "load_level": level,
+        }
+
+        if level == LOAD_NORMAL or not settings.get("allow_degradation", True):
+            return plan
+
+        index = RESOLUTION_LADDER.index(base_resolution)
+
+        if level == LOAD_ELEVATED:
+            # Step down one resolution; the lower preset brings its lower frame rate
+            new_resolution = RESOLUTION_LADDER[max(0, index - 1)]
+            new_frame_rate = min(PRESET_FRAME_RATES[new_resolution], base_frame_rate)
+        else:
+            # Lowest resolution and a draft frame rate below its preset
+            new_resolution = RESOLUTION_LADDER[0]
+            new_frame_rate = min(PRESET_FRAME_RATES[new_resolution], self.draft_frame_rate,
+                                 base_frame_rate)
+
+        # Only a real drop in output quality counts as a downgrade
+        if new_resolution == base_resolution and new_frame_rate >= base_frame_rate:
+            return plan
+
+        plan["resolution"] = new_resolution
+        plan["frame_rate"] = new_frame_rate
+        plan["degraded"] = True
+        plan["draft"] = level == LOAD_OVERLOADED and bool(settings.get("allow_draft", False))
+
+        return plan
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current load figures, for health reporting"""
+        return {
+            "active_renders": self.active_renders,
+            "average_render_time": round(self.average_render_time(), 2),
+            "load_level": self.load_level()
+        }
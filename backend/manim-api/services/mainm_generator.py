@@ -4,18 +4,63 @@ import subprocess
 import tempfile
 import asyncio
 import time
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, List
 import logging
 import re
+import uuid
+
+from services.load_policy import OverloadPolicy, LOAD_NORMAL, PRESET_FRAME_RATES
+from services.template_cache import TemplateRenderCache
+from services.codegen_backend import PromptBatcher, create_backend
+from services.prompt_cache import PromptCache
 
 logger = logging.getLogger(__name__)
 
+RESOLUTION_MAP = {"480p": (854, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+# Patterns used to recognise unmodified template output
+BACKGROUND_PATTERN = re.compile(r'self\.camera\.background_color = "(#[0-9A-Fa-f]{6})"')
+BACKGROUND_LINE_PATTERN = re.compile(r'^[ \t]*self\.camera\.background_color = .*\n', re.MULTILINE)
+TRAILING_WAIT_PATTERN = re.compile(r'self\.wait\(([0-9.]+)\)\s*$')
+
+# Keywords that select each prompt template, checked in this order
+TEMPLATE_KEYWORDS = {
+    "circle": ['circle', 'round', 'ball'],
+    "square": ['square', 'rectangle', 'box'],
+    "text": ['text', 'write', 'words', 'letters'],
+    "graph": ['graph', 'plot', 'chart']
+}
+
 class ManimGenerator:
     def __init__(self):
         self.manim_path = os.getenv("MANIM_PATH", "manim")
         self.output_dir = os.getenv("OUTPUT_DIR", "../uploads/videos")
         self.temp_dir = os.getenv("TEMP_DIR", "../uploads/temp")
         self.render_tasks = {}  # Store async render tasks
+        self.overload_policy = OverloadPolicy()
+        self.deferred_poll_interval = float(os.getenv("RENDER_DEFERRED_POLL_INTERVAL", "5"))
+        self.max_deferred_renders = int(os.getenv("RENDER_MAX_DEFERRED", "20"))
+        self.deferred_renders = set()  # Strong references to queued full quality renders
+        self.deferred_worker = asyncio.Semaphore(1)  # Deferred renders run one at a time
+        self.template_cache = TemplateRenderCache()
+        self._manim_version = None
+        
+        # Templates whose output only varies by background color and trailing
+        # wait, with the length of their animated part in seconds
+        self.reusable_templates = {
+            "circle": (self._generate_circle_animation, 4),
+            "square": (self._generate_square_animation, 4),
+            "graph": (self._generate_graph_animation, 3),
+            "default": (self._generate_default_animation, 5)
+        }
+        
+        # Prompt-to-code backend, fed through a micro-batcher and prompt cache
+        codegen_backend = create_backend(self._generate_manim_code_from_prompt)
+        self.codegen_batcher = PromptBatcher(codegen_backend)
+        self.prompt_cache = PromptCache(
+            allow_near_duplicates=codegen_backend.allow_near_duplicates,
+            template_keywords=[word for words in TEMPLATE_KEYWORDS.values() for word in words]
+        )
         
     async def initialize(self):
         """Initialize the Manim generator"""
@@ -26,11 +71,13 @@ class ManimGenerator:
             if result.returncode != 0:
                 raise Exception("Manim not found or not properly installed")
                 
-            logger.info(f"Manim version: {result.stdout.strip()}")
+            self._manim_version = result.stdout.strip()
+            logger.info(f"Manim version: {self._manim_version}")
             
             # Ensure output directories exist
             os.makedirs(self.output_dir, exist_ok=True)
             os.makedirs(self.temp_dir, exist_ok=True)
+            os.makedirs(self.template_cache.cache_dir, exist_ok=True)
             
         except Exception as e:
             logger.error(f"Failed to initialize Manim generator: {e}")
@@ -45,6 +92,21 @@ class ManimGenerator:
         except:
             return "Unknown"
 
+    async def _get_cached_version(self) -> str:
+        """Manim version, recorded by initialize() or looked up once without blocking"""
+        if self._manim_version is None:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.manim_path, "--version",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, _ = await process.communicate()
+                self._manim_version = stdout.decode().strip() if process.returncode == 0 else "Unknown"
+            except OSError:
+                self._manim_version = "Unknown"
+        return self._manim_version
+
     async def prompt_to_manim(self, prompt: str, duration: float = 5.0, 
                             resolution: str = "720p", frame_rate: int = 30,
                             background_color: str = "#000000") -> str:
@@ -56,19 +118,30 @@ class ManimGenerator:
         
         try:
             # Parse resolution
-            res_map = {"480p": (854, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
-            width, height = res_map.get(resolution, (1280, 720))
+            width, height = RESOLUTION_MAP.get(resolution, (1280, 720))
             
-            # Simple keyword-based code generation
-            # In production, replace this with AI-powered prompt-to-code conversion
-            manim_code = self._generate_manim_code_from_prompt(
-                prompt, duration, width, height, frame_rate, background_color
-            )
+            cache_settings = (duration, width, height, frame_rate, background_color)
+            manim_code = self.prompt_cache.get(prompt, cache_settings)
+            if manim_code is not None:
+                logger.info("Code generation served from prompt cache")
+                return manim_code
+            
+            # Generate through the configured backend (keyword templates by default)
+            manim_code = await self.codegen_batcher.submit({
+                "prompt": prompt,
+                "duration": duration,
+                "width": width,
+                "height": height,
+                "frame_rate": frame_rate,
+                "background_color": background_color
+            })
             
             # Validate generated code
             if not self._validate_manim_code(manim_code):
                 raise Exception("Generated Manim code validation failed")
             
+            self.prompt_cache.put(prompt, cache_settings, manim_code)
+            
             generation_time = time.time() - start_time
             logger.info(f"Code generation completed in {generation_time:.2f}s")
             
@@ -78,6 +151,13 @@ class ManimGenerator:
             logger.error(f"Error in prompt_to_manim: {e}")
             raise
 
+    def get_codegen_metrics(self) -> Dict[str, Any]:
+        """Prompt cache and batching statistics"""
+        return {
+            "cache": self.prompt_cache.get_metrics(),
+            "batching": self.codegen_batcher.get_metrics()
+        }
+
     def _generate_manim_code_from_prompt(self, prompt: str, duration: float,
                                        width: int, height: int, frame_rate: int,
                                        background_color: str) -> str:
@@ -90,16 +170,16 @@ class ManimGenerator:
         prompt_lower = prompt.lower()
         
         # Detect animation type
-        if any(word in prompt_lower for word in ['circle', 'round', 'ball']):
+        if any(word in prompt_lower for word in TEMPLATE_KEYWORDS["circle"]):
             return self._generate_circle_animation(duration, background_color)
-        elif any(word in prompt_lower for word in ['square', 'rectangle', 'box']):
+        elif any(word in prompt_lower for word in TEMPLATE_KEYWORDS["square"]):
             return self._generate_square_animation(duration, background_color)
-        elif any(word in prompt_lower for word in ['text', 'write', 'words', 'letters']):
+        elif any(word in prompt_lower for word in TEMPLATE_KEYWORDS["text"]):
             # Extract text to animate
             text_match = re.search(r'["\']([^"\']+)["\']', prompt)
             text_content = text_match.group(1) if text_match else "Hello World"
             return self._generate_text_animation(text_content, duration, background_color)
-        elif any(word in prompt_lower for word in ['graph', 'plot', 'chart']):
+        elif any(word in prompt_lower for word in TEMPLATE_KEYWORDS["graph"]):
             return self._generate_graph_animation(duration, background_color)
         else:
             # Default to a simple shape animation
@@ -245,53 +325,46 @@ class GeneratedAnimation(Scene):
         return all(element in code for element in required_elements)
 
     async def render_manim(self, manim_code: str, filename: str, 
-                         settings: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+                         settings: Dict[str, Any],
+                         background: bool = False) -> Tuple[str, Dict[str, Any]]:
         """
-        Render Manim code to video file
+        Render Manim code to video file.
+        Background renders are left out of the live queue depth and render times.
         """
         start_time = time.time()
+        render_time = None
+        if not background:
+            self.overload_policy.start_render()
         
         try:
-            # Create temporary Python file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', 
-                                           dir=self.temp_dir, delete=False) as f:
-                f.write(manim_code)
-                temp_py_file = f.name
-            
             # Prepare output path
             output_path = os.path.join(self.output_dir, filename)
             
-            # Build Manim command
-            resolution = settings.get('resolution', '720p')
+            # Pick quality, stepping down if the service is overloaded
+            requested_resolution = settings.get('resolution', '720p')
+            plan = self.overload_policy.plan(requested_resolution, settings)
+            resolution = plan["resolution"]
             quality_flag = self._get_quality_flag(resolution)
             
-            cmd = [
-                self.manim_path,
-                temp_py_file,
-                "GeneratedAnimation",
-                quality_flag,
-                "--output_file", output_path,
-                "--disable_caching"
-            ]
-            
-            # Run Manim rendering
-            logger.info(f"Running command: {' '.join(cmd)}")
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+            frame_rate = plan["frame_rate"]
             
-            stdout, stderr = await process.communicate()
+            extra_args = []
+            if frame_rate != PRESET_FRAME_RATES.get(resolution, 30):
+                extra_args = ["--frame_rate", str(frame_rate)]
             
-            if process.returncode != 0:
-                error_msg = stderr.decode() if stderr else "Unknown rendering error"
-                logger.error(f"Manim rendering failed: {error_msg}")
-                raise Exception(f"Rendering failed: {error_msg}")
+            # Unmodified templates are composited from a cached render
+            template_info = None
+            template_match = self._match_template(manim_code)
+            if template_match:
+                try:
+                    template_info = await self._render_from_template(
+                        *template_match, output_path, resolution, frame_rate
+                    )
+                except Exception as e:
+                    logger.warning(f"Template reuse failed, falling back to full render: {e}")
             
-            # Clean up temp file
-            os.unlink(temp_py_file)
+            if template_info is None:
+                await self._run_manim(manim_code, output_path, quality_flag, extra_args)
             
             # Verify output file exists
             if not os.path.exists(output_path):
@@ -306,22 +379,191 @@ class GeneratedAnimation(Scene):
                 "render_time": render_time,
                 "file_size": file_size,
                 "resolution": resolution,
-                "filename": filename
+                "frame_rate": frame_rate,
+                "filename": filename,
+                "degraded": plan["degraded"],
+                "load_level": plan["load_level"]
             }
             
+            if template_info:
+                render_info["template_reuse"] = template_info
+            
+            if plan["degraded"]:
+                render_info["requested_resolution"] = requested_resolution
+                render_info["requested_frame_rate"] = plan["requested_frame_rate"]
+                logger.warning(f"Render degraded under load: {requested_resolution} -> {resolution}")
+            
+            if plan["draft"]:
+                render_info["draft"] = True
+                full_quality_task_id = self._queue_full_quality_render(
+                    manim_code, filename, settings
+                )
+                if full_quality_task_id:
+                    render_info["full_quality_task_id"] = full_quality_task_id
+            
             logger.info(f"Rendering completed in {render_time:.2f}s, file size: {file_size} bytes")
             
             return output_path, render_info
             
         except Exception as e:
             logger.error(f"Error in render_manim: {e}")
-            # Clean up temp file if it exists
+            raise
+        finally:
+            if not background:
+                self.overload_policy.finish_render(render_time)
+
+    async def _run_manim(self, manim_code: str, output_path: str, quality_flag: str,
+                         extra_args: List[str]):
+        """Write Manim code to a temporary file and render it with the Manim CLI"""
+        # Create temporary Python file
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', 
+                                       dir=self.temp_dir, delete=False) as f:
+            f.write(manim_code)
+            temp_py_file = f.name
+        
+        try:
+            cmd = [
+                self.manim_path,
+                temp_py_file,
+                "GeneratedAnimation",
+                quality_flag,
+                "--output_file", output_path,
+                "--disable_caching",
+                *extra_args
+            ]
+            
+            # Run Manim rendering
+            logger.info(f"Running command: {' '.join(cmd)}")
+            
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            
+            stdout, stderr = await process.communicate()
+            
+            if process.returncode != 0:
+                error_msg = stderr.decode() if stderr else "Unknown rendering error"
+                logger.error(f"Manim rendering failed: {error_msg}")
+                raise Exception(f"Rendering failed: {error_msg}")
+        finally:
+            # Clean up temp file
             try:
-                if 'temp_py_file' in locals():
-                    os.unlink(temp_py_file)
-            except:
+                os.unlink(temp_py_file)
+            except OSError:
                 pass
-            raise
+
+    def _match_template(self, manim_code: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Check whether code is unmodified output of a reusable template.
+        Returns (template, background color, trailing wait) or None.
+        """
+        bg_match = BACKGROUND_PATTERN.search(manim_code)
+        wait_match = TRAILING_WAIT_PATTERN.search(manim_code)
+        if not bg_match or not wait_match:
+            return None
+        
+        bg_color = bg_match.group(1)
+        body = TRAILING_WAIT_PATTERN.sub('', manim_code)
+        
+        for name, (generator, animated_length) in self.reusable_templates.items():
+            expected = generator(animated_length, bg_color)
+            if TRAILING_WAIT_PATTERN.sub('', expected) == body:
+                return name, bg_color, float(wait_match.group(1))
+        
+        return None
+
+    async def _render_from_template(self, template: str, bg_color: str, wait: float,
+                                    output_path: str, resolution: str,
+                                    frame_rate: int) -> Dict[str, Any]:
+        """
+        Produce a template variant by compositing its cached transparent render
+        onto the requested background and padding the trailing wait
+        """
+        generator, animated_length = self.reusable_templates[template]
+        # At the animated length the template's own wait is its 0.1s minimum
+        base_code = BACKGROUND_LINE_PATTERN.sub('', generator(animated_length, "#000000"))
+        base_path = self.template_cache.base_path(
+            template, resolution, frame_rate, base_code, await self._get_cached_version()
+        )
+        cache_hit = True
+        
+        async with self.template_cache.lock_for(base_path):
+            if not os.path.exists(base_path):
+                cache_hit = False
+                # Unique per render, so other worker processes never share it
+                fd, partial_path = tempfile.mkstemp(
+                    dir=self.template_cache.cache_dir, prefix=".partial_", suffix=".mov"
+                )
+                os.close(fd)
+                
+                try:
+                    logger.info(f"Rendering template base: {base_path}")
+                    await self._run_manim(
+                        base_code, partial_path, self._get_quality_flag(resolution),
+                        ["--frame_rate", str(frame_rate), "--transparent"]
+                    )
+                    if os.path.getsize(partial_path) == 0:
+                        raise Exception("Template base render was not created")
+                    os.replace(partial_path, base_path)
+                finally:
+                    if os.path.exists(partial_path):
+                        os.unlink(partial_path)
+        
+        width, height = RESOLUTION_MAP.get(resolution, (1280, 720))
+        await self.template_cache.composite(
+            base_path, output_path, bg_color, width, height, frame_rate,
+            pad_seconds=max(0.0, wait - 0.1)
+        )
+        
+        return {"template": template, "cache_hit": cache_hit}
+
+    def _queue_full_quality_render(self, manim_code: str, filename: str,
+                                   settings: Dict[str, Any]) -> Optional[str]:
+        """
+        Queue the full quality version of a draft render for when load drops.
+        Returns None when too many are already pending; the draft is served as is.
+        """
+        if len(self.deferred_renders) >= self.max_deferred_renders:
+            logger.warning(f"Deferred render queue full, serving draft only for {filename}")
+            return None
+        
+        task_id = str(uuid.uuid4())
+        name, ext = os.path.splitext(filename)
+        full_settings = {**settings, "allow_degradation": False}
+        
+        self.render_tasks[task_id] = {"status": "queued", "progress": 0}
+        task = asyncio.create_task(
+            self._render_when_idle(manim_code, f"{name}_full{ext}", full_settings, task_id)
+        )
+        self.deferred_renders.add(task)
+        task.add_done_callback(self.deferred_renders.discard)
+        
+        logger.info(f"Queued full quality render {task_id} for {filename}")
+        return task_id
+
+    async def _render_when_idle(self, manim_code: str, filename: str,
+                                settings: Dict[str, Any], task_id: str):
+        """
+        Render on the single deferred worker once live load is back to normal,
+        so draining the backlog never competes with live jobs for capacity
+        """
+        async with self.deferred_worker:
+            while self.overload_policy.load_level() != LOAD_NORMAL:
+                await asyncio.sleep(self.deferred_poll_interval)
+            
+            await self.render_async(manim_code, filename, settings, task_id, background=True)
+
+    async def shutdown(self):
+        """Cancel full quality renders that are still waiting to run"""
+        if not self.deferred_renders:
+            return
+        
+        logger.warning(f"Dropping {len(self.deferred_renders)} deferred full quality renders")
+        for task in list(self.deferred_renders):
+            task.cancel()
+        await asyncio.gather(*self.deferred_renders, return_exceptions=True)
 
     def _get_quality_flag(self, resolution: str) -> str:
         """Get Manim quality flag based on resolution"""
@@ -333,14 +575,17 @@ class GeneratedAnimation(Scene):
         return quality_map.get(resolution, "-qm")
 
     async def render_async(self, manim_code: str, filename: str, 
-                         settings: Dict[str, Any], task_id: str):
+                         settings: Dict[str, Any], task_id: str,
+                         background: bool = False):
         """
         Async rendering for background processing
         """
         try:
             self.render_tasks[task_id] = {"status": "processing", "progress": 0}
             
-            video_path, render_info = await self.render_manim(manim_code, filename, settings)
+            video_path, render_info = await self.render_manim(
+                manim_code, filename, settings, background=background
+            )
             
             self.render_tasks[task_id] = {
                 "status": "completed",
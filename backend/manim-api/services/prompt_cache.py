@@ -0,0 +1,141 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, Any, Optional, Tuple, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUOTED_PATTERN = re.compile(r'["\']([^"\']+)["\']')
+WORD_PATTERN = re.compile(r"[a-z0-9#]+")
+
+# Words that change what gets drawn; prompts differing in one never match.
+# These are compared as whole words (or their plurals).
+SHAPE_WORDS = {
+    "circle", "square", "rectangle", "triangle", "polygon", "ellipse", "oval",
+    "line", "arrow", "dot", "point", "star", "arc", "curve", "graph", "axes",
+    "cube", "sphere", "box", "ball"
+}
+COLOR_WORDS = {
+    "red", "blue", "green", "yellow", "orange", "purple", "pink", "white",
+    "black", "gray", "grey", "gold", "teal", "maroon", "brown"
+}
+
+
+class PromptCache:
+    """
+    Caches generated Manim code by normalized prompt and generation settings.
+
+    Only identical normalized prompts match by default. With near duplicate
+    matching enabled, a prompt also matches one whose words are nearly the
+    same in the same order, as long as any quoted text is identical and none
+    of the differing words is protected: a shape or color word, a hex color,
+    or a word containing one of template_keywords (which prompt templates
+    match as substrings).
+    """
+
+    def __init__(self, allow_near_duplicates: bool = False,
+                 template_keywords: Iterable[str] = ()):
+        self.ttl = float(os.getenv("PROMPT_CACHE_TTL", "3600"))
+        self.max_entries = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1024"))
+        self.similarity_threshold = float(os.getenv("PROMPT_CACHE_SIMILARITY", "0.9"))
+        self.allow_near_duplicates = allow_near_duplicates
+        self.protected_words = SHAPE_WORDS | COLOR_WORDS
+        self.template_keywords = set(template_keywords)
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _normalize(self, prompt: str) -> Tuple[str, Tuple[str, ...], Tuple[str, ...]]:
+        """Normalized prompt text, its words and its quoted strings"""
+        quoted = tuple(QUOTED_PATTERN.findall(prompt))
+        words = tuple(WORD_PATTERN.findall(prompt.lower()))
+        return " ".join(words), words, quoted
+
+    def _is_protected(self, word: str) -> bool:
+        if word.startswith("#"):
+            return True
+        if word in self.protected_words or (word.endswith("s") and word[:-1] in self.protected_words):
+            return True
+        # Templates match their keywords as substrings, so protect words containing one
+        return any(keyword in word for keyword in self.template_keywords)
+
+    def _near_duplicate_score(self, words: Tuple[str, ...], other: Tuple[str, ...]) -> float:
+        """Ordered word similarity, or 0 if the prompts differ in a protected word"""
+        matcher = SequenceMatcher(a=words, b=other, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            if any(self._is_protected(word) for word in words[i1:i2] + other[j1:j2]):
+                return 0.0
+        return matcher.ratio()
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created"] > self.ttl
+
+    def get(self, prompt: str, settings: Tuple) -> Optional[str]:
+        """Cached code for a prompt with the given settings, if any"""
+        normalized, words, quoted = self._normalize(prompt)
+        key = (settings, normalized, quoted)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._expired(entry):
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["code"]
+
+        if not self.allow_near_duplicates:
+            self.misses += 1
+            return None
+
+        # Fall back to the most similar unexpired prompt with the same settings
+        best_key, best_score = None, 0.0
+        for other_key, other in list(self._entries.items()):
+            if other_key[0] != settings or other_key[2] != quoted:
+                continue
+            if self._expired(other):
+                del self._entries[other_key]
+                continue
+            score = self._near_duplicate_score(words, other["words"])
+            if score > best_score:
+                best_key, best_score = other_key, score
+
+        if best_key is not None and best_score >= self.similarity_threshold:
+            self._entries.move_to_end(best_key)
+            self.near_hits += 1
+            return self._entries[best_key]["code"]
+
+        self.misses += 1
+        return None
+
+    def put(self, prompt: str, settings: Tuple, code: str):
+        """Store generated code, evicting the least recently used entries when full"""
+        normalized, words, quoted = self._normalize(prompt)
+        key = (settings, normalized, quoted)
+
+        self._entries[key] = {"code": code, "words": words, "created": time.time()}
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0
+        }
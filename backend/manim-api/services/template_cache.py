@@ -0,0 +1,76 @@
+import os
+import hashlib
+import asyncio
+from typing import Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateRenderCache:
+    """
+    Stores transparent renders of the animated part of each built-in template,
+    keyed by template, resolution and frame rate, and composites them onto a
+    solid background with ffmpeg to produce requested variants.
+    """
+
+    def __init__(self):
+        self.cache_dir = os.getenv("TEMPLATE_CACHE_DIR", "../uploads/template_cache")
+        self.ffmpeg_path = os.getenv("FFMPEG_PATH", "ffmpeg")
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def base_path(self, template: str, resolution: str, frame_rate: int,
+                  base_code: str, manim_version: str) -> str:
+        """
+        Path of the cached transparent render for a template. The name includes
+        a hash of the rendered code and Manim version, so editing a template or
+        upgrading Manim never reuses a stale render.
+        """
+        digest = hashlib.sha256(f"{manim_version}\n{base_code}".encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{template}_{resolution}_{frame_rate}fps_{digest}.mov")
+
+    def lock_for(self, path: str) -> asyncio.Lock:
+        """Lock guarding creation of a cached render, so it is only rendered once"""
+        if path not in self._locks:
+            self._locks[path] = asyncio.Lock()
+        return self._locks[path]
+
+    async def composite(self, base_path: str, output_path: str, bg_color: str,
+                        width: int, height: int, frame_rate: int,
+                        pad_seconds: float):
+        """
+        Overlay a cached transparent render on a solid background and hold the
+        last frame for pad_seconds
+        """
+        color = "0x" + bg_color.lstrip("#")
+        filter_graph = (
+            "[0:v][1:v]overlay=shortest=1,"
+            f"tpad=stop_mode=clone:stop_duration={pad_seconds:.3f}"
+        )
+
+        cmd = [
+            self.ffmpeg_path,
+            "-f", "lavfi",
+            "-i", f"color=c={color}:s={width}x{height}:r={frame_rate}",
+            "-i", base_path,
+            "-filter_complex", filter_graph,
+            "-c:v", "libx264",
+            "-pix_fmt", "yuv420p",
+            "-r", str(frame_rate),
+            "-y",  # Overwrite output file
+            output_path
+        ]
+
+        logger.info(f"Running command: {' '.join(cmd)}")
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        stdout, stderr = await process.communicate()
+
+        if process.returncode != 0 or not os.path.exists(output_path):
+            error_msg = stderr.decode() if stderr else "Unknown ffmpeg error"
+            raise Exception(f"Template composite failed: {error_msg}")
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from services.codegen_backend import CodeGenBackend, PromptBatcher
+
+
+def make_request(prompt):
+    return {
+        "prompt": prompt,
+        "duration": 5.0,
+        "width": 1280,
+        "height": 720,
+        "frame_rate": 30,
+        "background_color": "#000000"
+    }
+
+
+class EchoBackend(CodeGenBackend):
+    name = "echo"
+
+    def __init__(self, fail_on=None, fail_whole_batch=False):
+        self.fail_on = fail_on
+        self.fail_whole_batch = fail_whole_batch
+        self.calls = []
+
+    async def generate_batch(self, requests):
+        self.calls.append(len(requests))
+        prompts = [request["prompt"] for request in requests]
+        if self.fail_whole_batch and self.fail_on in prompts:
+            raise Exception("batch failed")
+        return [Exception("bad prompt") if prompt == self.fail_on else f"code for {prompt}"
+                for prompt in prompts]
+
+
+async def submit_all(batcher, prompts):
+    return await asyncio.gather(
+        *[batcher.submit(make_request(prompt)) for prompt in prompts],
+        return_exceptions=True
+    )
+
+
+def test_incomplete_backend_cannot_be_built():
+    class IncompleteBackend(CodeGenBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+def test_concurrent_prompts_share_one_batch():
+    backend = EchoBackend()
+    batcher = PromptBatcher(backend)
+
+    results = asyncio.run(submit_all(batcher, ["a", "b", "c", "a"]))
+
+    assert results == ["code for a", "code for b", "code for c", "code for a"]
+    assert backend.calls == [3]
+    assert batcher.get_metrics()["average_batch_size"] == 4.0
+
+
+@pytest.mark.parametrize("fail_whole_batch", [False, True])
+def test_failing_prompt_does_not_fail_others(fail_whole_batch):
+    backend = EchoBackend(fail_on="b", fail_whole_batch=fail_whole_batch)
+    batcher = PromptBatcher(backend)
+
+    results = asyncio.run(submit_all(batcher, ["a", "b", "c"]))
+
+    assert results[0] == "code for a"
+    assert isinstance(results[1], Exception)
+    assert results[2] == "code for c"
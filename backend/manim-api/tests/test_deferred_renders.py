@@ -0,0 +1,31 @@
+import asyncio
+
+from services.mainm_generator import ManimGenerator
+
+
+def test_deferred_renders_run_one_at_a_time_outside_live_queue(monkeypatch):
+    generator = ManimGenerator()
+    generator.deferred_poll_interval = 0.01
+    running = []
+    peak = []
+
+    async def fake_render_manim(manim_code, filename, settings, background=False):
+        assert background
+        running.append(filename)
+        peak.append((len(running), generator.overload_policy.active_renders))
+        await asyncio.sleep(0.01)
+        running.remove(filename)
+        return filename, {}
+
+    monkeypatch.setattr(generator, "render_manim", fake_render_manim)
+
+    async def run():
+        task_ids = [generator._queue_full_quality_render("code", f"{i}.mp4", {})
+                    for i in range(3)]
+        await asyncio.gather(*generator.deferred_renders)
+        return task_ids
+
+    task_ids = asyncio.run(run())
+
+    assert all(generator.render_tasks[task_id]["status"] == "completed" for task_id in task_ids)
+    assert peak == [(1, 0)] * 3
@@ -0,0 +1,72 @@
+import pytest
+
+from services.load_policy import (
+    OverloadPolicy, LOAD_NORMAL, LOAD_ELEVATED, LOAD_OVERLOADED
+)
+
+
+def make_policy(active_renders=0, render_times=()):
+    policy = OverloadPolicy()
+    policy.queue_soft_limit = 4
+    policy.queue_hard_limit = 8
+    policy.latency_soft_limit = 30
+    policy.latency_hard_limit = 90
+    policy.draft_frame_rate = 10
+    policy.active_renders = active_renders
+    policy.recent_render_times.extend(render_times)
+    return policy
+
+
+@pytest.mark.parametrize("active_renders, render_times, expected", [
+    (0, (), LOAD_NORMAL),
+    (3, (), LOAD_NORMAL),
+    (4, (), LOAD_ELEVATED),
+    (8, (), LOAD_OVERLOADED),
+    (1, (40, 40), LOAD_ELEVATED),
+    (1, (100, 100), LOAD_OVERLOADED),
+    # Slow history is ignored once nothing is queued
+    (0, (100, 100), LOAD_NORMAL),
+])
+def test_load_level(active_renders, render_times, expected):
+    assert make_policy(active_renders, render_times).load_level() == expected
+
+
+@pytest.mark.parametrize("active_renders, resolution, settings, expected", [
+    # Normal load leaves every job at its preset
+    (0, "1080p", {}, ("1080p", 60, False, False)),
+    (0, "480p", {"allow_draft": True}, ("480p", 15, False, False)),
+    # Elevated load steps down one resolution with its preset frame rate
+    (4, "1080p", {}, ("720p", 30, True, False)),
+    (4, "720p", {"frame_rate": 30}, ("480p", 15, True, False)),
+    (4, "480p", {"frame_rate": 30}, ("480p", 15, False, False)),
+    # Unknown resolutions render with the 720p preset
+    (4, "4k", {}, ("480p", 15, True, False)),
+    (0, "4k", {}, ("4k", 30, False, False)),
+    # Hard overload drops to 480p at the draft frame rate
+    (8, "1080p", {}, ("480p", 10, True, False)),
+    (8, "480p", {}, ("480p", 10, True, False)),
+    # Drafts are only served under hard overload
+    (8, "720p", {"allow_draft": True}, ("480p", 10, True, True)),
+    (4, "720p", {"allow_draft": True}, ("480p", 15, True, False)),
+    # An explicit frame rate override replaces the preset and is capped when degrading
+    (0, "720p", {"frame_rate_override": 60}, ("720p", 60, False, False)),
+    (4, "1080p", {"frame_rate_override": 24}, ("720p", 24, True, False)),
+    (8, "720p", {"frame_rate_override": 60}, ("480p", 10, True, False)),
+    # Opting out keeps full quality at any load
+    (8, "1080p", {"allow_degradation": False, "allow_draft": True}, ("1080p", 60, False, False)),
+])
+def test_plan(active_renders, resolution, settings, expected):
+    plan = make_policy(active_renders).plan(resolution, settings)
+
+    assert (plan["resolution"], plan["frame_rate"], plan["degraded"], plan["draft"]) == expected
+
+
+def test_plan_without_real_drop_is_not_degraded():
+    policy = make_policy(8)
+    policy.draft_frame_rate = 30
+
+    plan = policy.plan("480p", {"allow_draft": True})
+
+    assert plan["degraded"] is False
+    assert plan["draft"] is False
+    assert plan["resolution"] == "480p"
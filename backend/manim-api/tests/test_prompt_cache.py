@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from services.prompt_cache import PromptCache
+from services.mainm_generator import ManimGenerator, TEMPLATE_KEYWORDS
+
+SETTINGS = (5.0, 1280, 720, 30, "#000000")
+
+LONG_PROMPT = ("draw a large {shape} in the middle of the screen that slowly grows "
+               "and then moves to the right side before fading out at the very end")
+
+
+@pytest.fixture
+def near_cache():
+    keywords = [word for words in TEMPLATE_KEYWORDS.values() for word in words]
+    return PromptCache(allow_near_duplicates=True, template_keywords=keywords)
+
+
+def test_exact_normalized_match_hits():
+    cache = PromptCache()
+    cache.put("Draw a blue circle!", SETTINGS, "circle code")
+
+    assert cache.get("draw a   BLUE circle", SETTINGS) == "circle code"
+    assert cache.get_metrics()["hits"] == 1
+
+
+def test_near_duplicates_disabled_by_default():
+    cache = PromptCache()
+    cache.put(LONG_PROMPT.format(shape="circle"), SETTINGS, "circle code")
+
+    assert cache.get(LONG_PROMPT.format(shape="circle") + " please", SETTINGS) is None
+    assert cache.get_metrics()["misses"] == 1
+
+
+def test_different_settings_miss():
+    cache = PromptCache()
+    cache.put("draw a blue circle", SETTINGS, "circle code")
+
+    assert cache.get("draw a blue circle", (5.0, 1920, 1080, 30, "#000000")) is None
+
+
+def test_near_duplicate_with_harmless_difference_hits(near_cache):
+    near_cache.put(LONG_PROMPT.format(shape="circle"), SETTINGS, "circle code")
+
+    assert near_cache.get(LONG_PROMPT.format(shape="circle") + " please", SETTINGS) == "circle code"
+    assert near_cache.get_metrics()["near_hits"] == 1
+
+
+@pytest.mark.parametrize("shape", ["box", "square", "triangle", "graph"])
+def test_keyword_difference_misses(near_cache, shape):
+    near_cache.put(LONG_PROMPT.format(shape="circle"), SETTINGS, "circle code")
+
+    assert near_cache.get(LONG_PROMPT.format(shape=shape), SETTINGS) is None
+    assert near_cache.get_metrics()["near_hits"] == 0
+
+
+def test_color_difference_misses(near_cache):
+    near_cache.put(LONG_PROMPT.format(shape="red circle"), SETTINGS, "red circle code")
+
+    assert near_cache.get(LONG_PROMPT.format(shape="blue circle"), SETTINGS) is None
+
+
+def test_reordered_keywords_miss(near_cache):
+    near_cache.put("show a circle over some text", SETTINGS, "circle code")
+
+    assert near_cache.get("show some text over a circle", SETTINGS) is None
+
+
+def test_quoted_text_must_match(near_cache):
+    near_cache.put('write the text "Hello" on screen', SETTINGS, "hello code")
+
+    assert near_cache.get('write the text "Goodbye" on screen', SETTINGS) is None
+
+
+def test_expired_entries_miss(monkeypatch):
+    cache = PromptCache()
+    cache.put("draw a blue circle", SETTINGS, "circle code")
+
+    monkeypatch.setattr(cache, "ttl", -1)
+    assert cache.get("draw a blue circle", SETTINGS) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PromptCache()
+    cache.max_entries = 2
+    cache.put("draw a blue circle", SETTINGS, "circle code")
+    cache.put("draw a green square", SETTINGS, "square code")
+    cache.get("draw a blue circle", SETTINGS)
+    cache.put("plot a sine graph", SETTINGS, "graph code")
+
+    assert cache.get("draw a green square", SETTINGS) is None
+    assert cache.get("draw a blue circle", SETTINGS) == "circle code"
+    assert cache.get_metrics()["evictions"] == 1
+
+
+def test_generator_does_not_reuse_code_across_keywords():
+    generator = ManimGenerator()
+
+    async def generate():
+        circle = await generator.prompt_to_manim(LONG_PROMPT.format(shape="circle"))
+        box = await generator.prompt_to_manim(LONG_PROMPT.format(shape="box"))
+        return circle, box
+
+    circle_code, box_code = asyncio.run(generate())
+
+    assert "Circle(" in circle_code
+    assert "Square(" in box_code
+    assert generator.get_codegen_metrics()["cache"]["near_hits"] == 0
+
+
+@pytest.mark.parametrize("word", ["entered", "start", "search", "online"])
+def test_words_only_containing_shape_or_color_words_are_not_protected(near_cache, word):
+    assert not near_cache._is_protected(word)
+
+
+@pytest.mark.parametrize("word", ["red", "triangles", "#ff0000", "boxes", "rounded", "plotting"])
+def test_shape_color_and_keyword_words_are_protected(near_cache, word):
+    assert near_cache._is_protected(word)
+
+
+def test_template_backend_serves_near_duplicates_end_to_end():
+    generator = ManimGenerator()
+
+    async def generate():
+        first = await generator.prompt_to_manim(LONG_PROMPT.format(shape="circle"))
+        second = await generator.prompt_to_manim(LONG_PROMPT.format(shape="circle") + " please")
+        different = await generator.prompt_to_manim(LONG_PROMPT.format(shape="square"))
+        return first, second, different
+
+    first, second, different = asyncio.run(generate())
+
+    assert second == first
+    assert "Square(" in different
+    metrics = generator.get_codegen_metrics()
+    assert metrics["cache"]["near_hits"] == 1
+    assert metrics["batching"]["requests"] == 2
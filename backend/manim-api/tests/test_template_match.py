@@ -0,0 +1,48 @@
+import pytest
+
+from services.mainm_generator import ManimGenerator
+
+DURATIONS = [1.0, 3.0, 4.0, 5.0, 7.5, 30.0, 60.0]
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return ManimGenerator()
+
+
+@pytest.mark.parametrize("template", ["circle", "square", "graph", "default"])
+@pytest.mark.parametrize("duration", DURATIONS)
+def test_round_trip(generator, template, duration):
+    template_fn, animated_length = generator.reusable_templates[template]
+    code = template_fn(duration, "#1a2B3c")
+
+    assert generator._match_template(code) == (
+        template, "#1a2B3c", max(0.1, duration - animated_length)
+    )
+
+
+@pytest.mark.parametrize("bg_color", ["BLUE", "#fff", "#12345g", "red"])
+def test_non_hex_background_does_not_match(generator, bg_color):
+    code = generator._generate_circle_animation(5.0, bg_color)
+
+    assert generator._match_template(code) is None
+
+
+@pytest.mark.parametrize("duration", DURATIONS)
+def test_text_template_does_not_match(generator, duration):
+    code = generator._generate_text_animation("Hello World", duration, "#000000")
+
+    assert generator._match_template(code) is None
+
+
+@pytest.mark.parametrize("edit", [
+    lambda code: code.replace("color=BLUE", "color=GREEN"),
+    lambda code: code.replace("run_time=1.5", "run_time=2", 1),
+    lambda code: code + "        self.play(FadeOut(circle))\n",
+    lambda code: code.replace("self.wait(", "self.wait(1)\n        self.wait("),
+    lambda code: "# user edit\n" + code,
+])
+def test_edited_code_does_not_match(generator, edit):
+    code = edit(generator._generate_circle_animation(5.0, "#000000"))
+
+    assert generator._match_template(code) is None